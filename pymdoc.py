@@ -3,19 +3,128 @@
 from __future__ import print_function
 import argparse
 import ast
+import contextlib
+import gzip
+import hashlib
+import inspect
+import json
 import logging
 import os
+import re
+import subprocess
+import sys
+import tempfile
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 import codegen   # SourceGenerator generates source code from AST
 
 
+INDEX_FILE_NAME = "pymdoc-index.json"
+"""Name of the index file saved next to generated files in output path"""
+
+MANIFEST_FILE_NAME = "pymdoc-manifest.txt"
+"""Name of the file listing all generated files in output path"""
+
+LOCK_FILE_NAME = ".pymdoc.lock"
+"""Name of the file locked while index in output path is updated"""
+
+SOURCE_EXTENSIONS = (".py", ".bzl")
+"""Extensions of source files picked up when input is a directory"""
+
+STARLARK_EXTENSIONS = (".bzl",)
+"""Extensions of source files extracted in Starlark mode by default"""
+
+STARLARK_RULES = ("rule", "repository_rule", "macro", "aspect")
+"""Starlark functions which define rules with attributes"""
+
+STARLARK_PROVIDERS = ("provider",)
+"""Starlark functions which define providers with fields"""
+
+
 class Error(Exception):
     """Known errors"""
     pass
 
 
+@contextlib.contextmanager
+def atomic_open(path, mode="w"):
+    """Open temporary file next to path which replaces path
+    when closed without errors, so readers and concurrent writers
+    never see partially written file"""
+    handle, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".",
+        prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        with os.fdopen(handle, mode) as temp_file:
+            yield temp_file
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+@contextlib.contextmanager
+def locked(output_path):
+    """Hold advisory lock of output path (no-op without fcntl)"""
+    with open(os.path.join(output_path, LOCK_FILE_NAME), "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
 class SignaturGenerator(codegen.SourceGenerator):
-    """Overwrites SourceGenerator to produce Bazel-like function signature"""
+    """Overwrites SourceGenerator to produce Bazel-like function signature,
+    default values are cut after max_length nodes or characters"""
+    def __init__(self, indent_with, add_line_information=False,
+                 max_length=None):
+        codegen.SourceGenerator.__init__(self, indent_with,
+                                         add_line_information)
+        self.max_length = max_length
+        self.budget = None
+        self.skipped = False
+
+    def visit(self, node):
+        """Visit node unless budget of nodes is exhausted"""
+        if self.budget is not None:
+            if self.budget <= 0:
+                self.skipped = True
+                return None
+            self.budget -= 1
+        return codegen.SourceGenerator.visit(self, node)
+
+    def default(self, node):
+        """Write default value of argument"""
+        if self.max_length is None:
+            self.visit(node)
+            return
+        start = len(self.result)
+        self.budget = self.max_length
+        self.skipped = False
+        self.visit(node)
+        self.budget = None
+        text = "".join(self.result[start:])
+        if self.skipped or len(text) > self.max_length:
+            del self.result[start:]
+            self.write(text[:self.max_length] + "...")
+
     def signature(self, node):
         self.newline()
         self.write(self.indent_with)
@@ -30,19 +139,33 @@ class SignaturGenerator(codegen.SourceGenerator):
             else:
                 want_comma.append(True)
 
-        padding = [None] * (len(node.args) - len(node.defaults))
-        for arg, default in zip(node.args, padding + node.defaults):
+        def write_arg(arg, default, prefix=""):
+            """Write argument (ast.arg or name) with default value"""
             write_comma()
-            self.visit(arg)
+            self.write(prefix + getattr(arg, "arg", arg))
             if default is not None:
                 self.write("=")
-                self.visit(default)
+                self.default(default)
+
+        posonlyargs = getattr(node, "posonlyargs", [])
+        args = posonlyargs + node.args
+        padding = [None] * (len(args) - len(node.defaults))
+        for position, (arg, default) in enumerate(
+                zip(args, padding + node.defaults)):
+            write_arg(arg, default)
+            if position + 1 == len(posonlyargs):
+                write_comma()
+                self.write("/")
         if node.vararg is not None:
+            write_arg(node.vararg, None, "*")
+        elif getattr(node, "kwonlyargs", None):
             write_comma()
-            self.write("*" + node.vararg)
+            self.write("*")
+        for arg, default in zip(getattr(node, "kwonlyargs", []),
+                                getattr(node, "kw_defaults", [])):
+            write_arg(arg, default)
         if node.kwarg is not None:
-            write_comma()
-            self.write("**" + node.kwarg)
+            write_arg(node.kwarg, None, "**")
 
     def visit_FunctionDef(self, node):
         self.newline(extra=1)
@@ -53,6 +176,166 @@ class SignaturGenerator(codegen.SourceGenerator):
         self.newline()
         self.write(")")
 
+    def visit_Constant(self, node):
+        self.write(repr(node.value))
+
+    def visit_JoinedStr(self, node):
+        def text(node):
+            """Source of f-string without quotes"""
+            parts = []
+            for value in node.values:
+                if isinstance(value, ast.Constant):
+                    parts.append(value.value.replace("{", "{{")
+                                 .replace("}", "}}"))
+                    continue
+                parts.append("{" + to_source(value.value))
+                if value.conversion != -1:
+                    parts.append("!" + chr(value.conversion))
+                if value.format_spec is not None:
+                    parts.append(":" + text(value.format_spec))
+                parts.append("}")
+            return "".join(parts)
+        self.write("f" + repr(text(node)))
+
+    def visit_Call(self, node):
+        want_comma = []
+
+        def write_comma():
+            """Write comma between arguments"""
+            if want_comma:
+                self.write(", ")
+            else:
+                want_comma.append(True)
+
+        self.visit(node.func)
+        self.write("(")
+        for arg in node.args:
+            write_comma()
+            self.visit(arg)
+        for keyword in node.keywords:
+            write_comma()
+            self.write("**" if keyword.arg is None else keyword.arg + "=")
+            self.visit(keyword.value)
+        self.write(")")
+
+
+def to_source(node, max_length=None, default=False):
+    """Source code of AST node in signature style,
+    node is rendered as default value of argument if default is set"""
+    generator = SignaturGenerator(" " * 4, False, max_length)
+    if default:
+        generator.default(node)
+    else:
+        generator.visit(node)
+    return "".join(generator.result).replace("'", '"')
+
+
+def code_block(code):
+    """Markdown block of python code (signature of item)"""
+    return "```python\n" + code + "\n```"
+
+
+def table_cell(text):
+    """Escape text to fit in one cell of Markdown table"""
+    return " ".join((text or "").split()).replace("|", "\\|")
+
+
+class DocstringProcessor(object):
+    """
+    Post-processing of extracted docstrings:
+    normalises indentation and links names of known symbols,
+    results are memoized so identical docstrings are processed once
+    """
+
+    CODE = re.compile(r"```.*?```|`[^`\n]*`|\[[^\]\n]*\]\([^)\n]*\)"
+                      r"|^(?: {4}|\t)[^\n]*$", re.DOTALL | re.MULTILINE)
+    """Code blocks, inline code, indented lines and existing links"""
+
+    WORD = re.compile(r"\b[A-Za-z_][A-Za-z0-9_]*\b")
+    """Words which may be names of symbols"""
+
+    IDENTIFIER = re.compile(r"[A-Z_]")
+    """Words with underscore or uppercase letter are linked in prose,
+    other names (e.g. build, update) only as inline code"""
+
+    def __init__(self):
+        """Init instance"""
+        self.symbols = {}
+        self.dedent_cache = {}
+        self.link_cache = {}
+
+    def add_symbol(self, name, target):
+        """Make name linked to target in docstrings"""
+        if self.symbols.get(name) != target:
+            self.symbols[name] = target
+            self.link_cache = {}
+
+    def clear(self):
+        """Drop memoized results, symbols are kept"""
+        self.dedent_cache = {}
+        self.link_cache = {}
+
+    def dedent(self, docstring):
+        """Remove indentation and leading/trailing blank lines
+        the same way ast.get_docstring() does"""
+        if docstring not in self.dedent_cache:
+            self.dedent_cache[docstring] = inspect.cleandoc(docstring)
+        return self.dedent_cache[docstring]
+
+    def link(self, docstring, name=None):
+        """Replace names of known symbols with Markdown links,
+        names in prose are linked if they look like identifiers,
+        names given as inline code (`name`) always, other code,
+        existing links and name of documented item are left untouched.
+        Every word is looked up in symbols, so it takes linear time
+        regardless of number of symbols"""
+        if not self.symbols or not docstring:
+            return docstring
+        if docstring not in self.link_cache:
+            self.link_cache[docstring] = self.link_words(docstring)
+        result, linked = self.link_cache[docstring]
+        if name in linked:
+            key = (docstring, name)
+            if key not in self.link_cache:
+                self.link_cache[key] = self.link_words(docstring, name)
+            result = self.link_cache[key][0]
+        return result
+
+    def link_words(self, docstring, skip=None):
+        """Link known symbols except skip, return text and linked names"""
+        linked = set()
+
+        def replace(match):
+            """Link for known symbol"""
+            name = match.group(0)
+            if (name in self.symbols and name != skip
+                    and self.IDENTIFIER.search(name)):
+                linked.add(name)
+                return "[{}]({})".format(name, self.symbols[name])
+            return name
+
+        result = []
+        position = 0
+        for code in self.CODE.finditer(docstring):
+            result.append(self.WORD.sub(replace,
+                                        docstring[position:code.start()]))
+            text = code.group(0)
+            name = text[1:-1]
+            if text[:1] == "`" and name in self.symbols and name != skip:
+                linked.add(name)
+                text = "[{}]({})".format(text, self.symbols[name])
+            result.append(text)
+            position = code.end()
+        result.append(self.WORD.sub(replace, docstring[position:]))
+        return "".join(result), linked
+
+
+def md_file_name(name, extension="md", name_replace={"_": "-"}):
+    """Name of documentation file for given item name"""
+    for source in name_replace:
+        name = name.replace(source, name_replace[source])
+    return name + "." + extension
+
 
 class DocstringExtractor(object):
     """
@@ -60,10 +343,22 @@ class DocstringExtractor(object):
     for given python file
     """
 
-    def __init__(self, filename=None, output_file=None, output_path=None):
-        """Init instance"""
+    def __init__(self, filename=None, output_file=None, output_path=None,
+                 processor=None, starlark=None, max_default_length=None):
+        """Init instance, processor may be shared between instances,
+        starlark mode is enabled for .bzl files unless starlark is given,
+        default values in signatures are cut after max_default_length"""
+        self.processor = processor or DocstringProcessor()
+        self.starlark = starlark
+        self.max_default_length = max_default_length
+        self.assignments = {}
+        self.filename = None
         self.items = []
+        self.lines = []
+        self.kinds = []
         self.module_docstring = None
+        self.outputs = {}
+        self.errors = []
         if filename:
             self.run(filename, output_file, output_path)
 
@@ -88,9 +383,18 @@ class DocstringExtractor(object):
         and comments (Expr) which goes after assignments (Assign)"""
         if not os.path.isfile(filename):
             raise Error("File '{}' does not exists".format(filename))
-        content = open(filename).read()
-        tree = ast.parse(content)
-        logging.debug("AST:\n%s\n\n", ast.dump(tree))
+        self.filename = filename
+        if self.starlark is None:
+            self.starlark = filename.endswith(STARLARK_EXTENSIONS)
+        with open(filename) as source_file:
+            tree = ast.parse(source_file.read(), filename)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("AST:\n%s\n\n", ast.dump(tree))
+        if self.starlark:
+            self.assignments = dict(
+                (node.targets[0].id, node.value) for node in tree.body
+                if isinstance(node, ast.Assign)
+                and isinstance(node.targets[0], ast.Name))
 
         assignment = False
         first = False
@@ -99,32 +403,211 @@ class DocstringExtractor(object):
             if isinstance(node, ast.Module):
                 first = True
                 continue
-            if isinstance(node, ast.FunctionDef):
-                docstring = ast.get_docstring(node)
-                if docstring:
-                    generator = SignaturGenerator(" " * 4, False)
-                    generator.visit(node)
-                    code = "".join(generator.result)
-                    code = code.replace("'", '"')
-                    code = "```python\n" + code + "\n```"
-                    logging.debug("CODE:\n%s", code)
-                self.items.append((node.name, docstring, code))
+            try:
+                assignment = self.extract_node(node, assignment, first)
+            except Exception as error:  # pylint: disable=broad-except
+                line = getattr(node, "lineno", None)
+                logging.warning("%s:%s: %s", filename, line, error)
+                self.errors.append((filename, line, error))
                 assignment = False
-            elif isinstance(node, ast.Assign):
-                assignment = node.targets[0].id
-            elif isinstance(node, ast.Expr):
-                if hasattr(node.value, "s"):
-                    docstring = node.value.s
+            first = False
+        self.assignments = {}
+
+    def source(self, node, default=False):
+        """Source code of AST node, see to_source()"""
+        return to_source(node, self.max_default_length, default)
+
+    def compact(self):
+        """Keep extracted docstrings compressed until expand()"""
+        data = json.dumps([self.module_docstring, self.items])
+        self.items = zlib.compress(data.encode("utf-8"))
+        self.module_docstring = None
+
+    def expand(self):
+        """Restore docstrings compressed by compact()"""
+        self.module_docstring, self.items = self.expanded()
+
+    def expanded(self):
+        """Module docstring and items, compressed ones are decompressed
+        without keeping them in memory"""
+        if not isinstance(self.items, bytes):
+            return self.module_docstring, self.items
+        data = json.loads(zlib.decompress(self.items).decode("utf-8"))
+        return data[0], [tuple(item) for item in data[1]]
+
+    def extract_node(self, node, assignment, first):
+        """Extract docstring from one AST node,
+        return target of assignment the next node may document"""
+        if isinstance(node, ast.FunctionDef):
+            docstring = ast.get_docstring(node)
+            if docstring:
+                code = self.source(node)
+                logging.debug("CODE:\n%s", code)
+                self.items.append((node.name, docstring, code))
+                self.lines.append(node.lineno)
+                self.kinds.append("function")
+        elif isinstance(node, ast.Assign):
+            # NOTE: tuple and attribute targets are not documented
+            if isinstance(node.targets[0], ast.Name):
+                if self.starlark and self.extract_starlark(node):
+                    return False
+                return node.targets[0]
+        elif isinstance(node, ast.Expr):
+            if (isinstance(node.value, ast.Constant)
+                    and isinstance(node.value.value, str)):
+                docstring = self.processor.dedent(node.value.value)
+            else:
+                docstring = None
+            if first and docstring:
+                self.module_docstring = docstring
+            if assignment and docstring:
+                self.items.append((assignment.id, docstring))
+                self.lines.append(assignment.lineno)
+                self.kinds.append("variable")
+        return False
+
+    def extract_starlark(self, node):
+        """Extract documentation of rule or provider assigned to a name:
+        doc, attributes (attr.*) of rules and fields of providers.
+        Return True if assignment is such definition"""
+        call = node.value
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name)
+                and call.func.id in STARLARK_RULES + STARLARK_PROVIDERS):
+            return False
+        name = node.targets[0].id
+        kwargs = dict((keyword.arg, keyword.value)
+                      for keyword in call.keywords)
+        doc = kwargs.get("doc")
+        if doc is None and call.func.id in STARLARK_PROVIDERS and call.args:
+            doc = call.args[0]   # provider("doc", fields = ...)
+        if isinstance(doc, ast.Constant) and isinstance(doc.value, str):
+            docstring = self.processor.dedent(doc.value)
+        else:
+            docstring = ""
+        if call.func.id in STARLARK_PROVIDERS:
+            fields = kwargs.get("fields")
+            if isinstance(fields, ast.Name):
+                fields = self.assignments.get(fields.id)
+            params, table = self.provider_fields(fields)
+            title = "Fields"
+        else:
+            attrs = kwargs.get("attrs")
+            pairs = self.resolve_dict(attrs) if attrs is not None else []
+            if pairs is None:
+                logging.warning("%s:%s: attributes of '%s' are not resolved",
+                                self.filename, node.lineno, name)
+                pairs = []
+            params, table = self.rule_attributes(pairs)
+            if call.func.id != "aspect":
+                params.insert(0, "name")
+            title = "Attributes"
+        if table:
+            docstring += "\n\n# {}\n\n{}".format(title, "\n".join(table))
+        code = "{}(\n{}\n)".format(
+            name, ",\n".join(" " * 4 + param for param in params))
+        self.items.append((name, docstring.strip(), code))
+        self.lines.append(node.lineno)
+        self.kinds.append(call.func.id)
+        return True
+
+    def resolve_dict(self, node, depth=0):
+        """Key and value nodes of dict given as literal, module level
+        name, dict() call or union (| or +) of those, None if unknown"""
+        if depth > 20:
+            return None
+        if isinstance(node, ast.Name) and node.id in self.assignments:
+            return self.resolve_dict(self.assignments[node.id], depth + 1)
+        if isinstance(node, ast.BinOp) and isinstance(node.op,
+                                                      (ast.BitOr, ast.Add)):
+            left = self.resolve_dict(node.left, depth + 1)
+            right = self.resolve_dict(node.right, depth + 1)
+            return None if left is None or right is None else left + right
+        if isinstance(node, ast.Dict):
+            parts = []
+            for key, value in zip(node.keys, node.values):
+                if key is not None:
+                    parts.append([(key, value)])
+                else:   # {**other}
+                    parts.append(self.resolve_dict(value, depth + 1))
+        elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+              and node.func.id == "dict"):
+            parts = [self.resolve_dict(arg, depth + 1) for arg in node.args]
+            for keyword in node.keywords:
+                if keyword.arg is None:   # dict(**other)
+                    parts.append(self.resolve_dict(keyword.value, depth + 1))
                 else:
-                    docstring = None
-                if first and docstring:
-                    self.module_docstring = docstring
-                if assignment and docstring:
-                    self.items.append((assignment, docstring))
-                assignment = False
+                    parts.append([(ast.Constant(value=keyword.arg),
+                                   keyword.value)])
+        else:
+            return None
+        if None in parts:
+            return None
+        return [pair for part in parts for pair in part]
+
+    def rule_attributes(self, pairs):
+        """Signature parameters and Markdown table of rule attributes
+        given as pairs of key and value nodes, mandatory attributes
+        go first in signature, private ones (_name) are skipped"""
+        params = []
+        optional = []
+        table = ["| Name | Type | Mandatory | Default | Description |",
+                 "|------|------|-----------|---------|-------------|"]
+        for key, value in pairs:
+            if not (isinstance(key, ast.Constant)
+                    and isinstance(key.value, str)
+                    and not key.value.startswith("_")):
+                continue
+            attr_type = ""
+            kwargs = {}
+            if (isinstance(value, ast.Call)
+                    and isinstance(value.func, ast.Attribute)):
+                attr_type = value.func.attr
+                kwargs = dict((keyword.arg, keyword.value)
+                              for keyword in value.keywords)
+            doc = kwargs.get("doc")
+            default = kwargs.get("default")
+            mandatory = kwargs.get("mandatory")
+            mandatory = (isinstance(mandatory, ast.Constant)
+                         and mandatory.value is True)
+            if mandatory:
+                params.append(key.value)
+            elif default is not None:
+                optional.append("{}={}".format(
+                    key.value, self.source(default, default=True)))
             else:
-                assignment = False
-            first = False
+                optional.append(key.value)
+            table.append("| {} | {} | {} | {} | {} |".format(
+                key.value, attr_type, "yes" if mandatory else "no",
+                table_cell(self.source(default, default=True))
+                if default else "",
+                table_cell(doc.value if isinstance(doc, ast.Constant)
+                           else "")))
+        params.extend(optional)
+        return params, table if params else []
+
+    @staticmethod
+    def provider_fields(fields):
+        """Signature parameters and Markdown table of provider fields,
+        fields are given as list of names or dict of name: doc"""
+        params = []
+        table = ["| Name | Description |",
+                 "|------|-------------|"]
+        if isinstance(fields, ast.Dict):
+            pairs = zip(fields.keys, fields.values)
+        elif isinstance(fields, (ast.List, ast.Tuple)):
+            pairs = [(field, None) for field in fields.elts]
+        else:
+            return params, []
+        for key, doc in pairs:
+            if not (isinstance(key, ast.Constant)
+                    and isinstance(key.value, str)):
+                continue
+            params.append(key.value)
+            table.append("| {} | {} |".format(
+                key.value,
+                table_cell(doc.value if isinstance(doc, ast.Constant)
+                           else "")))
+        return params, table if params else []
 
     def print(self):
         """Print out result to console"""
@@ -146,29 +629,45 @@ class DocstringExtractor(object):
         for item in self.items:
             title(item[0])
             if len(item) > 2:
-                content(item[2])
+                content(code_block(item[2]))
             content(item[1])
 
+    def add_symbols(self, extension="md", name_replace={"_": "-"}):
+        """Make names of items linked to their documentation files"""
+        for item in self.items:
+            self.processor.add_symbol(
+                item[0], md_file_name(item[0], extension, name_replace))
+
+    def file_names(self, extension="md", name_replace={"_": "-"}):
+        """Documentation files of items: {item name: file name}"""
+        return dict((item[0], md_file_name(item[0], extension, name_replace))
+                    for item in self.expanded()[1])
+
     def save_to_path(self, output_path, extension="md",
                      name_replace={"_": "-"}):
-        """Save Docstrings in separate documentation files"""
+        """Save Docstrings in separate documentation files,
+        saved files are collected in outputs: {item name: file name}"""
         if not os.path.isdir(output_path):
             raise Error("Directory '{}' does not exists".format(output_path))
+        self.add_symbols(extension, name_replace)
         for item in self.items:
-            name = item[0]
-            for source in name_replace:
-                name = name.replace(source, name_replace[source])
-            md_file_name = name + "." + extension
-            md_file_path = os.path.join(output_path, md_file_name)
+            file_name = md_file_name(item[0], extension, name_replace)
+            md_file_path = os.path.join(output_path, file_name)
             logging.debug("Markdown file: %s", md_file_path)
-            with open(md_file_path, "w") as md_file:
+            self.outputs[item[0]] = file_name
+            with atomic_open(md_file_path) as md_file:
                 if len(item) > 2:
-                    md_file.write(item[2])
+                    md_file.write(code_block(item[2]))
                     md_file.write("\n\n")
-                md_file.write(item[1])
+                md_file.write(self.processor.link(item[1], item[0]))
 
     def save_to_file(self, output_file):
-        """Save Docstrings in separate documentation files"""
+        """Save Docstrings in one documentation file"""
+        with atomic_open(output_file) as file_handler:
+            self.write(file_handler)
+
+    def write(self, file_handler):
+        """Write Docstrings to opened file"""
         def write(file_handler, text):
             """Writes text to file with ending linefeeds"""
             if text:
@@ -176,28 +675,661 @@ class DocstringExtractor(object):
                 # file_handler.write("\n")
                 if not text.count("\n"):
                     file_handler.write("\n")
-        with open(output_file, "w") as file_handler:
-            if self.module_docstring:
-                write(file_handler, self.module_docstring)
-            for item in self.items:
-                if len(item) > 2:
-                    write(file_handler, item[2])
-                    file_handler.write("\n\n")
-                write(file_handler, item[1])
+        if self.module_docstring:
+            write(file_handler, self.module_docstring)
+        for item in self.items:
+            if len(item) > 2:
+                write(file_handler, code_block(item[2]))
+                file_handler.write("\n\n")
+            write(file_handler, item[1])
+
+
+def find_files(paths):
+    """Expand directories into sorted list of source files,
+    plain files are taken as is"""
+    filenames = []
+    for path in paths:
+        if not os.path.isdir(path):
+            filenames.append(os.path.normpath(path))
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(SOURCE_EXTENSIONS):
+                    filenames.append(
+                        os.path.normpath(os.path.join(root, name)))
+    return filenames
+
+
+def stable_hash(text):
+    """Hash which does not depend on interpreter run (unlike hash())"""
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16)
+
+
+def parse_shard(text):
+    """Parse shard specification "INDEX/COUNT" (INDEX is zero based)"""
+    try:
+        index, count = [int(value) for value in text.split("/")]
+    except ValueError:
+        raise Error("Wrong shard '{}', expected INDEX/COUNT".format(text))
+    if count < 1 or not 0 <= index < count:
+        raise Error("Wrong shard '{}', expected 0 <= INDEX < COUNT"
+                    .format(text))
+    return index, count
+
+
+def shard_files(filenames, index, count):
+    """Select files which belong to given shard.
+    Files are distributed largest first to the least loaded shard,
+    files of equal size are ordered by stable hash of the path,
+    so every worker computes the same partition independently"""
+    sizes = {}
+    for filename in set(filenames):
+        sizes[filename] = (os.path.getsize(filename)
+                           if os.path.isfile(filename) else 0)
+
+    loads = [0] * count
+    selected = set()
+    for filename in sorted(sizes, key=lambda name: (-sizes[name],
+                                                    stable_hash(name),
+                                                    name)):
+        shard = min(range(count), key=lambda i: (loads[i], i))
+        loads[shard] += sizes[filename] or 1
+        if shard == index:
+            selected.add(filename)
+    logging.debug("Shard %d/%d: loads=%s", index, count, loads)
+    return [filename for filename in filenames if filename in selected]
+
+
+def read_index(output_path):
+    """Read index of generated files:
+    {source file: {item name: generated file}}"""
+    index_path = os.path.join(output_path, INDEX_FILE_NAME)
+    if not os.path.isfile(index_path):
+        return {}
+    with open(index_path) as index_file:
+        return json.load(index_file)
+
+
+def write_index(output_path, index):
+    """Write index of generated files and manifest listing them"""
+    index_path = os.path.join(output_path, INDEX_FILE_NAME)
+    with atomic_open(index_path) as index_file:
+        json.dump(index, index_file, indent=2, sort_keys=True)
+        index_file.write("\n")
+    manifest_path = os.path.join(output_path, MANIFEST_FILE_NAME)
+    with atomic_open(manifest_path) as manifest_file:
+        for file_name in sorted(set(
+                file_name for outputs in index.values()
+                for file_name in outputs.values())):
+            manifest_file.write(file_name + "\n")
 
 
-def parse_args():
-    """Parse command line arguments"""
-    parser = argparse.ArgumentParser(description=__doc__)
+def check_collisions(index):
+    """Raise error if the same file is generated for several sources,
+    since items with the same name would overwrite each other"""
+    owners = {}
+    collisions = []
+    for source in sorted(index):
+        for file_name in sorted(index[source].values()):
+            owner = owners.setdefault(file_name, source)
+            if owner != source:
+                collisions.append("'{}' of '{}' and '{}'".format(
+                    file_name, source, owner))
+    if collisions:
+        raise Error("Items with the same name in several files: {}"
+                    .format(", ".join(collisions)))
+
+
+def index_sources(index, filenames):
+    """Sources of index which are given files, compared by real path
+    since index may list them spelled differently"""
+    paths = set(os.path.realpath(filename) for filename in filenames)
+    return [source for source in index if os.path.realpath(source) in paths]
+
+
+def stale_sources(index, filenames):
+    """Sources of index replaced by full build of given files:
+    the files themselves and sources which no longer exist"""
+    return index_sources(index, filenames) + [
+        source for source in index if not os.path.exists(source)]
+
+
+def update_index(output_path, entries, removed=()):
+    """Update entries of index, caller holds locked() output path
+    while generated files are written and index is updated,
+    so several processes may share output path. Entries of removed
+    sources are dropped, generated files which are no longer
+    listed in index are deleted"""
+    index = read_index(output_path)
+    old_files = set(file_name
+                    for source in list(entries) + list(removed)
+                    for file_name in index.get(source, {}).values())
+    for source in removed:
+        index.pop(source, None)
+    index.update(entries)
+    files = set(file_name for outputs in index.values()
+                for file_name in outputs.values())
+    for file_name in sorted(old_files - files):
+        md_file_path = os.path.join(output_path, file_name)
+        if os.path.isfile(md_file_path):
+            logging.debug("Remove: %s", md_file_path)
+            os.remove(md_file_path)
+    write_index(output_path, index)
+
+
+def peak_rss():
+    """Peak resident set size of the process in KiB (None if unknown)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def add_error(errors, filename, error):
+    """Log and record error of one file"""
+    line = getattr(error, "lineno", None)
+    logging.error("%s:%s: %s", filename, line, error)
+    errors.append((filename, line, error))
+
+
+def extract_files(filenames, errors, starlark=None, max_file_size=None,
+                  low_memory=False, max_default_length=None):
+    """Run DocstringExtractor for every file and return extractors.
+    Files bigger than max_file_size (bytes) are skipped and added
+    to errors, in low memory mode extracted docstrings are kept
+    compressed until saved.
+    Failure of one file does not stop the run, it is added to errors"""
+    processor = DocstringProcessor()
+    extractors = []
+    for filename in filenames:
+        logging.debug("Input file: %s", filename)
+        if (max_file_size and os.path.isfile(filename)
+                and os.path.getsize(filename) > max_file_size):
+            add_error(errors, filename, Error(
+                "Skipped, size {} exceeds {} bytes".format(
+                    os.path.getsize(filename), max_file_size)))
+            continue
+        extractor = DocstringExtractor(
+            processor=processor, starlark=starlark,
+            max_default_length=max_default_length)
+        peak_before = peak_rss()
+        try:
+            extractor.extract(filename)
+            extractors.append(extractor)
+            extractor.add_symbols()
+            if low_memory:
+                extractor.compact()
+                processor.clear()
+        except Exception as error:  # pylint: disable=broad-except
+            add_error(errors, filename, error)
+        errors.extend(extractor.errors)
+        if peak_before is not None:
+            # NOTE: process peak only grows, its increase is the memory
+            #       this file needed above any file before it
+            peak_after = peak_rss()
+            logging.info("%s: process peak RSS %d KiB (+%d KiB)", filename,
+                         peak_after, peak_after - peak_before)
+    return extractors
+
+
+def render(extractors, errors, output_file=None, output_path=None,
+           low_memory=False, replaced=()):
+    """Save or print docstrings of all extractors,
+    update index of generated files when output path is used,
+    entries of replaced files (see stale_sources()) are dropped from
+    index. Output path is locked while index is read, files are
+    written and index is updated"""
+    if output_path and not os.path.isdir(output_path):
+        raise Error("Directory '{}' does not exists".format(output_path))
+    if output_file:
+        with atomic_open(output_file) as output:
+            render_extractors(extractors, errors, output,
+                              low_memory=low_memory)
+    elif output_path:
+        with locked(output_path):
+            removed = stale_sources(read_index(output_path), replaced)
+            render_index(extractors, errors, output_path, low_memory,
+                         removed)
+    else:
+        render_extractors(extractors, errors, low_memory=low_memory)
+
+
+def render_index(extractors, errors, output_path, low_memory=False,
+                 removed=()):
+    """Save docstrings of all extractors to output path and update
+    its index, entries of removed sources are dropped. Caller holds
+    locked() output path. Fails before writing anything if the same
+    file would be generated for several sources"""
+    sources = set(extractor.filename for extractor in extractors)
+    planned = dict((source, outputs)
+                   for source, outputs in read_index(output_path).items()
+                   if source not in removed and source not in sources)
+    for extractor in extractors:
+        planned[extractor.filename] = extractor.file_names()
+    check_collisions(planned)
+    index = render_extractors(extractors, errors, None, output_path,
+                              low_memory)
+    update_index(output_path, index, removed)
+
+
+def render_extractors(extractors, errors, output=None, output_path=None,
+                      low_memory=False):
+    """Write docstrings of all extractors to opened output file,
+    output path or console, return index of generated files"""
+    index = {}
+    for extractor in extractors:
+        try:
+            extractor.expand()
+            if output:
+                extractor.write(output)
+            elif output_path:
+                extractor.save_to_path(output_path)
+                index[extractor.filename] = extractor.outputs
+            else:
+                extractor.print()
+        except Exception as error:  # pylint: disable=broad-except
+            add_error(errors, extractor.filename, error)
+        if low_memory:
+            extractor.items = []
+            extractor.module_docstring = None
+    return index
+
+
+def build(filenames, output_file=None, output_path=None, starlark=None,
+          max_file_size=None, low_memory=False, dump_file=None,
+          max_default_length=None):
+    """Extract docstrings of all files then render them,
+    all files are extracted first, so symbols of every file
+    can be linked from any other. With dump file extraction
+    result is saved, rendered only if output is given.
+    Output path keeps entries of other sources in index, entries of
+    given files (also failed ones) and of deleted sources are replaced.
+    Return list of errors: (file, line, exception)"""
+    if output_path and not os.path.isdir(output_path):
+        raise Error("Directory '{}' does not exists".format(output_path))
+    errors = []
+    extractors = extract_files(filenames, errors, starlark, max_file_size,
+                               low_memory, max_default_length)
+    if dump_file:
+        write_dump(dump_file, extractors)
+        if not (output_file or output_path):
+            return errors
+    render(extractors, errors, output_file, output_path, low_memory,
+           filenames)
+    return errors
+
+
+def git_changed_files(revision):
+    """Files changed in working tree since given revision,
+    paths are relative to current directory"""
+    try:
+        root = subprocess.check_output(
+            ["git", "rev-parse", "--show-toplevel"]).decode().strip()
+        output = subprocess.check_output(
+            ["git", "diff", "--name-only", revision, "--"]).decode()
+    except (OSError, subprocess.CalledProcessError) as error:
+        raise Error("Cannot get files changed since '{}': {}"
+                    .format(revision, error))
+    return [os.path.relpath(os.path.join(root, path))
+            for path in output.splitlines() if path]
+
+
+def read_changed_files(list_file):
+    """Read list of changed files, one path per line ("-" for stdin)"""
+    if list_file == "-":
+        return [line.strip() for line in sys.stdin if line.strip()]
+    if not os.path.isfile(list_file):
+        raise Error("File '{}' does not exists".format(list_file))
+    with open(list_file) as changed_file:
+        return [line.strip() for line in changed_file if line.strip()]
+
+
+def update(filenames, changed, output_path, starlark=None,
+           max_file_size=None, low_memory=False, max_default_length=None):
+    """Rebuild documentation in output path only for changed files,
+    outputs of other files are kept as listed in the index.
+    Full build is done if there is no index or set of documented
+    names changes, since links in unchanged files depend on it.
+    Output path is locked for the whole update, so decisions are
+    based on the index which is updated.
+    Return list of errors: (file, line, exception)"""
+    if not os.path.isdir(output_path):
+        raise Error("Directory '{}' does not exists".format(output_path))
+    with locked(output_path):
+        index = read_index(output_path)
+        errors = []
+        if index:
+            changed = set(os.path.realpath(path) for path in changed)
+            inputs = set(os.path.realpath(filename)
+                         for filename in filenames)
+            indexed = set(os.path.realpath(source) for source in index)
+            modified = [filename for filename in filenames
+                        if os.path.realpath(filename) in changed
+                        or os.path.realpath(filename) not in indexed]
+            # NOTE: index may list sources of other runs sharing output
+            #       path, only sources changed (e.g. deleted) are removed
+            removed = [source for source in index
+                       if os.path.realpath(source) in changed
+                       and os.path.realpath(source) not in inputs]
+            replaced = index_sources(index, modified)
+            logging.info("Changed files: %d, removed: %d", len(modified),
+                         len(removed))
+
+            extractors = extract_files(modified, errors, starlark,
+                                       max_file_size, low_memory,
+                                       max_default_length)
+            # NOTE: files which failed or were skipped are removed
+            #       from index like in a full build
+            kept = dict((source, outputs)
+                        for source, outputs in index.items()
+                        if source not in removed and source not in replaced)
+            names = set(name for outputs in index.values()
+                        for name in outputs)
+            new_names = set(name for outputs in kept.values()
+                            for name in outputs)
+            if extractors:
+                processor = extractors[0].processor
+                new_names.update(processor.symbols)
+            else:
+                processor = DocstringProcessor()
+            if names == new_names:
+                for outputs in kept.values():
+                    for name, file_name in outputs.items():
+                        processor.add_symbol(name, file_name)
+                render_index(extractors, errors, output_path, low_memory,
+                             removed + replaced)
+                return errors
+            logging.info("Documented names changed, full build")
+            errors = []
+        else:
+            logging.info("No index in '%s', full build", output_path)
+            removed = []
+        extractors = extract_files(filenames, errors, starlark,
+                                   max_file_size, low_memory,
+                                   max_default_length)
+        render_index(extractors, errors, output_path, low_memory,
+                     removed + stale_sources(index, filenames))
+        return errors
+
+
+def open_dump(dump_file):
+    """Open dump file for reading, gzip compressed if name ends with .gz"""
+    if dump_file.endswith(".gz"):
+        return gzip.open(dump_file, "rt")
+    return open(dump_file)
+
+
+def write_dump(dump_file, extractors):
+    """Save extraction results as JSON lines, one line per source file:
+    {"file", "module_docstring", "items": [{"name", "kind", "line",
+    "docstring", "signature"}]}, signature is plain source code (None for
+    variables), gzip compressed if name ends with .gz"""
+    with atomic_open(dump_file, "wb") as raw_dump:
+        if dump_file.endswith(".gz"):
+            compressed = gzip.GzipFile(os.path.basename(dump_file), "wb",
+                                       fileobj=raw_dump)
+        else:
+            compressed = contextlib.nullcontext(raw_dump)
+        with compressed as dump:
+            for extractor in extractors:
+                module_docstring, extractor_items = extractor.expanded()
+                items = []
+                for item, line, kind in zip(extractor_items, extractor.lines,
+                                            extractor.kinds):
+                    items.append({"name": item[0], "kind": kind,
+                                  "line": line, "docstring": item[1],
+                                  "signature": item[2] if len(item) > 2
+                                  else None})
+                dump.write((json.dumps({
+                    "file": extractor.filename,
+                    "module_docstring": module_docstring,
+                    "items": items}) + "\n").encode("utf-8"))
+
+
+def load_dump(dump_file):
+    """Restore extractors saved by write_dump() without reading sources"""
+    if not os.path.isfile(dump_file):
+        raise Error("File '{}' does not exists".format(dump_file))
+    processor = DocstringProcessor()
+    extractors = []
+    with open_dump(dump_file) as dump:
+        for line in dump:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            extractor = DocstringExtractor(processor=processor)
+            extractor.filename = record["file"]
+            extractor.module_docstring = record["module_docstring"]
+            for item in record["items"]:
+                if item["signature"] is None:
+                    extractor.items.append((item["name"], item["docstring"]))
+                else:
+                    extractor.items.append((item["name"], item["docstring"],
+                                            item["signature"]))
+                extractor.lines.append(item["line"])
+                extractor.kinds.append(item["kind"])
+            extractor.add_symbols()
+            extractors.append(extractor)
+    return extractors
+
+
+def error_report(errors):
+    """Errors as list of {"file", "line", "error"} for JSON reports"""
+    return [{"file": filename, "line": line,
+             "error": "{}: {}".format(type(error).__name__, error)}
+            for filename, line, error in errors]
+
+
+def write_errors(errors_file, errors):
+    """Write report of errors collected during build (JSON)"""
+    with atomic_open(errors_file) as report_file:
+        json.dump(error_report(errors), report_file, indent=2)
+        report_file.write("\n")
+
+
+def merge(shard_paths, output_path):
+    """Combine generated files and indexes of several shards
+    into output path without parsing sources again. Every shard
+    links only its own names, names of the other shards are linked
+    while files are copied"""
+    if not os.path.isdir(output_path):
+        raise Error("Directory '{}' does not exists".format(output_path))
+    index = {}
+    shards = {}
+    for shard_path in shard_paths:
+        if not os.path.isfile(os.path.join(shard_path, INDEX_FILE_NAME)):
+            raise Error("Index in '{}' does not exists".format(shard_path))
+        for source, outputs in sorted(read_index(shard_path).items()):
+            if source in index:
+                logging.warning("Source '%s' found in several shards", source)
+            index[source] = outputs
+            shards[source] = shard_path
+    with locked(output_path):
+        planned = read_index(output_path)
+        planned.update(index)
+        check_collisions(planned)
+        processor = DocstringProcessor()
+        for outputs in index.values():
+            for name, file_name in outputs.items():
+                processor.add_symbol(name, file_name)
+        for source, outputs in sorted(index.items()):
+            for name, file_name in sorted(outputs.items()):
+                shard_file_path = os.path.join(shards[source], file_name)
+                md_file_path = os.path.join(output_path, file_name)
+                with open(shard_file_path) as shard_file:
+                    text = shard_file.read()
+                with atomic_open(md_file_path) as md_file:
+                    md_file.write(processor.link(text, name))
+        update_index(output_path, index)
+
+
+def snapshot(path, errors):
+    """Extract docstrings of file or tree as
+    {(source, kind, name, occurrence): (hash, item)}, sources are
+    relative to path (file name for single file), occurrence counts
+    items of the same name in source (e.g. methods of several classes)
+    from 1 in order of lines. Failed files are added to errors"""
+    if not os.path.exists(path):
+        raise Error("Path '{}' does not exists".format(path))
+    items = {}
+    for filename in find_files([path]):
+        extractor = DocstringExtractor()
+        try:
+            extractor.extract(filename)
+        except Exception as error:  # pylint: disable=broad-except
+            add_error(errors, filename, error)
+            continue
+        errors.extend(extractor.errors)
+        if os.path.isdir(path):
+            source = os.path.relpath(filename, path)
+        else:
+            source = os.path.basename(filename)
+        if extractor.module_docstring:
+            item = ("", extractor.module_docstring)
+            items[(source, "module", "", 1)] = (stable_hash(item[1]),
+                                                 item)
+        occurrences = {}
+        for line, item, kind in sorted(
+                zip(extractor.lines, extractor.items, extractor.kinds),
+                key=lambda entry: entry[0]):
+            key = (source, kind, item[0])
+            occurrences[key] = occurrences.get(key, 0) + 1
+            text = "\0".join(part or "" for part in item[1:])
+            items[key + (occurrences[key],)] = (stable_hash(text), item)
+    return items
+
+
+def diff(old_path, new_path):
+    """Compare docstrings and signatures of two files or trees,
+    items are matched by file, kind, name and occurrence, unchanged items
+    are skipped by comparing hashes only. Files which cannot be
+    extracted are listed in errors of the report"""
+    errors = []
+    old_items = snapshot(old_path, errors)
+    new_items = snapshot(new_path, errors)
+    report = {"added": [], "removed": [], "changed": []}
+
+    def entry(key):
+        """Report entry for item key, occurrence is given
+        only for repeated names"""
+        result = {"file": key[0], "kind": key[1], "name": key[2]}
+        if key[3] > 1:
+            result["occurrence"] = key[3]
+        return result
+
+    for key in sorted(new_items):
+        if key not in old_items:
+            report["added"].append(entry(key))
+            continue
+        old_hash, old_item = old_items[key]
+        new_hash, new_item = new_items[key]
+        if old_hash == new_hash:
+            continue
+        changed = entry(key)
+        changed.update({"changes": [], "old": {}, "new": {}})
+        for field, index in (("signature", 2), ("docstring", 1)):
+            old_value = old_item[index] if len(old_item) > index else None
+            new_value = new_item[index] if len(new_item) > index else None
+            if old_value != new_value:
+                changed["changes"].append(field)
+                changed["old"][field] = old_value
+                changed["new"][field] = new_value
+        report["changed"].append(changed)
+    for key in sorted(old_items):
+        if key not in new_items:
+            report["removed"].append(entry(key))
+    report["errors"] = error_report(errors)
+    return report
+
+
+def parse_args(argv=None):
+    """Parse command line arguments,
+    "merge" or "diff" as first argument selects the command"""
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["diff"]:
+        parser = argparse.ArgumentParser(
+            prog="pymdoc.py diff",
+            description="Report added, removed and changed docstrings "
+            "between two versions of file or folder, "
+            "fails if there are any changes")
+        parser.set_defaults(command="diff")
+        parser.add_argument("-v", "--verbose", action="count", default=0,
+                            help="verbosity level, use: [-v | -vv | -vvv]")
+        parser.add_argument("-o", "--output-file",
+                            help="save report (JSON) to specified file")
+        parser.add_argument("old", help="old version of file or folder")
+        parser.add_argument("new", help="new version of file or folder")
+        return parser.parse_args(argv[1:])
+    if argv[:1] == ["merge"]:
+        parser = argparse.ArgumentParser(
+            prog="pymdoc.py merge",
+            description="Merge outputs of several shards")
+        parser.set_defaults(command="merge")
+        parser.add_argument("-v", "--verbose", action="count", default=0,
+                            help="verbosity level, use: [-v | -vv | -vvv]")
+        parser.add_argument("-p", "--output-path", required=True,
+                            help="save merged files in specified folder")
+        parser.add_argument("shards", nargs="+",
+                            help="output paths of shards")
+        return parser.parse_args(argv[1:])
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        epilog="Use 'merge -p OUTPUT_PATH SHARD_PATH...' to merge shards, "
+        "'diff OLD NEW' to compare docstrings of two versions")
+    parser.set_defaults(command="build")
     parser.add_argument("-v", "--verbose", action="count", default=0,
                         help="verbosity level, use: [-v | -vv | -vvv]")
     parser.add_argument("-p", "--output-path",
                         help="save generated files in specified folder")
     parser.add_argument("-o", "--output-file",
                         help="save everything to specified file")
-    parser.add_argument("file",
-                        help="input file name, must be python module")
-    args = parser.parse_args()
+    parser.add_argument("-e", "--errors-file",
+                        help="save report of failed files and items (JSON)")
+    parser.add_argument("--starlark", action="store_true", default=None,
+                        help="extract Bazel rules and providers "
+                        "(default for .bzl files)")
+    parser.add_argument("--max-file-size", type=int,
+                        help="skip input files bigger than given bytes "
+                        "(reported as errors)")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="keep extracted docstrings compressed "
+                        "and release them as soon as saved")
+    parser.add_argument("--max-default-length", type=int,
+                        help="cut default values in signatures "
+                        "longer than given characters")
+    parser.add_argument("-d", "--dump",
+                        help="save extracted docstrings to JSON lines file "
+                        "(gzip compressed if name ends with .gz)")
+    parser.add_argument("-l", "--load",
+                        help="render docstrings from dump file "
+                        "instead of input files")
+    parser.add_argument("--changed-from", metavar="REVISION",
+                        help="update output path only for files changed "
+                        "since given git revision")
+    parser.add_argument("--changed", metavar="LIST_FILE",
+                        help="update output path only for files listed "
+                        "in given file, one per line ('-' for stdin)")
+    parser.add_argument("-s", "--shard",
+                        help="process only part INDEX/COUNT of input files")
+    parser.add_argument("files", nargs="*", metavar="file",
+                        help="input file name, must be python module, "
+                        "or folder with python modules")
+    args = parser.parse_args(argv)
+    if not args.files and not args.load:
+        parser.error("input files or --load are required")
+    if args.load:
+        for option, value in (("input files", args.files),
+                              ("--shard", args.shard),
+                              ("--changed", args.changed),
+                              ("--changed-from", args.changed_from),
+                              ("--dump", args.dump)):
+            if value:
+                parser.error("--load cannot be used with " + option)
+    if args.dump and (args.changed or args.changed_from):
+        parser.error("--dump cannot be used with incremental update")
     return args
 
 
@@ -208,19 +1340,61 @@ def main():
     if args.verbose > 1:
         logging.basicConfig(level=logging.DEBUG,
                             format="[%(levelname)s]: %(message)s")
+    elif args.verbose:
+        logging.basicConfig(level=logging.INFO,
+                            format="%(levelname)s:   %(message)s")
     else:
         logging.basicConfig(format="%(levelname)s:   %(message)s")
 
     logging.debug("Args: %s", args)
-    logging.debug("Input file: %s", args.file)
-    logging.debug("Output file: %s", args.output_file)
-    logging.debug("Output path: %s", args.output_path)
 
     color_red = "\033[91m"
     color_reset = "\033[0m"
     try:
-        DocstringExtractor(args.file, args.output_file, args.output_path)
-        return True
+        if args.command == "merge":
+            merge(args.shards, args.output_path)
+            return True
+        if args.command == "diff":
+            report = diff(args.old, args.new)
+            text = json.dumps(report, indent=2, sort_keys=True)
+            if args.output_file:
+                with atomic_open(args.output_file) as report_file:
+                    report_file.write(text + "\n")
+            else:
+                print(text)
+            return not any(report.values())
+        logging.debug("Output file: %s", args.output_file)
+        logging.debug("Output path: %s", args.output_path)
+        if args.load:
+            errors = []
+            render(load_dump(args.load), errors,
+                   args.output_file, args.output_path)
+        else:
+            filenames = find_files(args.files)
+            if args.shard:
+                filenames = shard_files(filenames, *parse_shard(args.shard))
+            if args.changed_from or args.changed:
+                if not args.output_path:
+                    raise Error("Incremental update requires output path")
+                if args.changed_from:
+                    changed = git_changed_files(args.changed_from)
+                else:
+                    changed = read_changed_files(args.changed)
+                errors = update(filenames, changed, args.output_path,
+                                args.starlark, args.max_file_size,
+                                args.low_memory, args.max_default_length)
+            else:
+                errors = build(filenames, args.output_file,
+                               args.output_path, args.starlark,
+                               args.max_file_size, args.low_memory,
+                               args.dump, args.max_default_length)
+        if args.errors_file:
+            write_errors(args.errors_file, errors)
+        if errors:
+            logging.error("%s%d error(s) in %d file(s)%s", color_red,
+                          len(errors), len(set(error[0] for error in errors)),
+                          color_reset)
+        return not errors
     except Error as error:
         logging.error("%s%s%s", color_red, error, color_reset)
     except Exception as error:  # pylint: disable=broad-except
@@ -0,0 +1,334 @@
+"""Tests of pymdoc batch runs"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pymdoc
+
+
+class BuildTest(unittest.TestCase):
+    """Builds of several source files into output path"""
+
+    def setUp(self):
+        """Create source and output folders"""
+        self.root = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.root)
+        os.mkdir("src")
+        os.mkdir("docs")
+
+    def tearDown(self):
+        """Remove created folders"""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root)
+
+    @staticmethod
+    def write(filename, content):
+        """Write source file"""
+        with open(filename, "w") as source_file:
+            source_file.write(content)
+
+    @staticmethod
+    def read_tree(path):
+        """Content of all files in folder: {file name: content}"""
+        tree = {}
+        for name in os.listdir(path):
+            if name != pymdoc.LOCK_FILE_NAME:
+                with open(os.path.join(path, name)) as tree_file:
+                    tree[name] = tree_file.read()
+        return tree
+
+    def test_collision(self):
+        """Items with the same name in several files are reported"""
+        self.write("src/a.py", 'def main():\n    """Main of a"""\n')
+        self.write("src/b.py", 'def main():\n    """Main of b"""\n')
+        with self.assertRaises(pymdoc.Error):
+            pymdoc.build(pymdoc.find_files(["src"]), output_path="docs")
+        self.assertEqual(self.read_tree("docs"), {})
+
+    def test_errors(self):
+        """Failed files and items are reported, the others are saved"""
+        self.write("src/a.py", 'def main():\n    """Main"""\n\n'
+                   'def broken(a={**x}):\n    """Broken"""\n')
+        self.write("src/b.py", 'a, b = 1, 2\n"""Pair"""\n'
+                   'self.value = 1\n"""Value"""\n'
+                   'LIMIT = 1\n"""Limit"""\n')
+        self.write("src/c.py", 'def broken(:\n')
+        errors = pymdoc.build(pymdoc.find_files(["src"]),
+                              output_path="docs")
+        self.assertEqual([(filename, line, type(error).__name__)
+                          for filename, line, error in errors],
+                         [("src/a.py", 4, "AttributeError"),
+                          ("src/c.py", 1, "SyntaxError")])
+        self.assertIn("(c.py, line 1)", str(errors[1][2]))
+        self.assertEqual(sorted(self.read_tree("docs")), [
+            "LIMIT.md", "main.md", pymdoc.INDEX_FILE_NAME,
+            pymdoc.MANIFEST_FILE_NAME])
+        pymdoc.write_errors("errors.json", errors)
+        with open("errors.json") as errors_file:
+            self.assertIn("c.py", errors_file.read())
+
+    def test_memory(self):
+        """Low memory mode keeps items compressed and gives the same
+        output, files over size limit are skipped and reported"""
+        self.write("src/a.py", 'def main():\n    """Main calls load_file"""\n')
+        self.write("src/b.py", 'def load_file():\n    """Load"""\n')
+        self.write("src/c.py", 'def huge():\n    """{}"""\n'.format(
+            "x" * 1000))
+        filenames = pymdoc.find_files(["src"])
+        extractors = pymdoc.extract_files(filenames, [], low_memory=True)
+        self.assertTrue(all(isinstance(extractor.items, bytes)
+                            for extractor in extractors))
+        errors = pymdoc.build(filenames, output_path="docs",
+                              low_memory=True, max_file_size=500)
+        self.assertEqual([(filename, type(error).__name__)
+                          for filename, line, error in errors],
+                         [("src/c.py", "Error")])
+        os.mkdir("full")
+        pymdoc.build(filenames[:2], output_path="full")
+        self.assertEqual(self.read_tree("docs"), self.read_tree("full"))
+
+    def test_links(self):
+        """Identifiers and inline code are linked, plain words
+        and the item's own name are not"""
+        self.write("src/a.py",
+                   'def main():\n    """main calls load_file"""\n\n'
+                   'def load_file():\n    """load_file of `main`"""\n')
+        pymdoc.build(pymdoc.find_files(["src"]), output_path="docs")
+        tree = self.read_tree("docs")
+        self.assertTrue(tree["main.md"].endswith(
+            "main calls [load_file](load-file.md)"))
+        self.assertTrue(tree["load-file.md"].endswith(
+            "load_file of [`main`](main.md)"))
+
+    def test_shards(self):
+        """Merged shards are the same as a full build,
+        names of other shards are linked"""
+        for index in range(6):
+            self.write("src/f{}.py".format(index),
+                       'def func_{}():\n    """Calls func_{}"""\n'.format(
+                           index, (index + 1) % 6))
+        filenames = pymdoc.find_files(["src"])
+        for index in range(2):
+            shard_path = "shard{}".format(index)
+            os.mkdir(shard_path)
+            pymdoc.build(pymdoc.shard_files(filenames, index, 2),
+                         output_path=shard_path)
+        pymdoc.merge(["shard0", "shard1"], "docs")
+        os.mkdir("full")
+        pymdoc.build(filenames, output_path="full")
+        self.assertEqual(self.read_tree("docs"), self.read_tree("full"))
+        self.assertTrue(self.read_tree("docs")["func-0.md"].endswith(
+            "Calls [func_1](func-1.md)"))
+
+    def test_shard_files(self):
+        """Shards are disjoint, complete, balanced by size and
+        do not depend on order of input files"""
+        for index in range(10):
+            self.write("src/f{}.py".format(index), "#" * (index + 1) * 100)
+        filenames = pymdoc.find_files(["src"])
+        for count in (1, 2, 3):
+            shards = [pymdoc.shard_files(filenames, index, count)
+                      for index in range(count)]
+            self.assertEqual(sorted(sum(shards, [])), sorted(filenames))
+            for index, shard in enumerate(shards):
+                self.assertEqual(shard, pymdoc.shard_files(
+                    list(reversed(filenames)), index, count)[::-1])
+            loads = [sum(os.path.getsize(filename) for filename in shard)
+                     for shard in shards]
+            self.assertLessEqual(max(loads) - min(loads), 1000)
+
+    def test_merge(self):
+        """Merge keeps outputs of other sources, fails on collision"""
+        self.write("src/a.py", 'def main():\n    """Main"""\n')
+        self.write("src/b.py", 'def helper():\n    """Helper"""\n')
+        self.write("src/c.py", 'def main():\n    """Other main"""\n')
+        for shard_path, filename in (("shard0", "src/a.py"),
+                                     ("shard1", "src/b.py"),
+                                     ("shard2", "src/c.py")):
+            os.mkdir(shard_path)
+            pymdoc.build([filename], output_path=shard_path)
+        pymdoc.merge(["shard0"], "docs")
+        pymdoc.merge(["shard1"], "docs")
+        self.assertEqual(pymdoc.read_index("docs"), {
+            "src/a.py": {"main": "main.md"},
+            "src/b.py": {"helper": "helper.md"}})
+        self.assertEqual(self.read_tree("docs")[pymdoc.MANIFEST_FILE_NAME],
+                         "helper.md\nmain.md\n")
+        with self.assertRaises(pymdoc.Error):
+            pymdoc.merge(["shard2"], "docs")
+        self.assertIn("Main", self.read_tree("docs")["main.md"])
+
+    def test_starlark_attrs(self):
+        """Attributes given by module level name are documented,
+        mandatory ones first, private ones are skipped"""
+        self.write("src/rules.bzl",
+                   '_ATTRS = {"srcs": attr.label_list(doc = "Sources")}\n'
+                   'my_rule = rule(doc = "My rule", attrs = dict(\n'
+                   '    _ATTRS, out = attr.output(mandatory = True),\n'
+                   '    _tool = attr.label(default = "//tools:tool")))\n'
+                   'MyInfo = provider("My info", fields = ["value"])\n')
+        extractor = pymdoc.DocstringExtractor()
+        extractor.extract("src/rules.bzl")
+        name, docstring, code = extractor.items[0]
+        self.assertEqual(name, "my_rule")
+        self.assertIn("| srcs | label_list | no |  | Sources |", docstring)
+        self.assertIn("| out | output | yes |  |  |", docstring)
+        self.assertNotIn("_tool", docstring + code)
+        self.assertIn("    name,\n    out,\n    srcs\n", code)
+        name, docstring, code = extractor.items[1]
+        self.assertEqual(name, "MyInfo")
+        self.assertTrue(docstring.startswith("My info\n"))
+
+    def assert_same_build(self, filenames):
+        """Output path equals to output of a full build of filenames"""
+        os.mkdir("full")
+        pymdoc.build(filenames, output_path="full")
+        trees = []
+        for path in ("docs", "full"):
+            tree = self.read_tree(path)
+            del tree[pymdoc.INDEX_FILE_NAME]
+            index = dict((os.path.realpath(source), outputs)
+                         for source, outputs
+                         in pymdoc.read_index(path).items())
+            trees.append((tree, index))
+        shutil.rmtree("full")
+        self.assertEqual(trees[0], trees[1])
+
+    def test_update(self):
+        """Incremental update gives the same output as a full build,
+        input and changed paths may be spelled differently"""
+        self.write("src/a.py", 'def main():\n    """Main calls helper"""\n')
+        self.write("src/b.py", 'def helper():\n    """Helper"""\n')
+        self.write("src/c.py", 'def extra():\n    """Extra"""\n')
+        pymdoc.build(pymdoc.find_files(["src"]), output_path="docs")
+        filenames = pymdoc.find_files([os.path.abspath("src")])
+
+        self.write("src/a.py", 'def main():\n    """Main, see helper"""\n')
+        pymdoc.update(filenames, ["src/a.py"], "docs")
+        self.assert_same_build(filenames)
+
+        os.remove("src/c.py")
+        self.write("src/b.py", 'def helper():\n    """Helper"""\n\n'
+                   'def other():\n    """Other"""\n')
+        filenames = pymdoc.find_files([os.path.abspath("src")])
+        pymdoc.update(filenames, ["src/b.py", "src/c.py"], "docs")
+        self.assert_same_build(filenames)
+        self.assertNotIn("extra.md", os.listdir("docs"))
+
+    def test_rebuild(self):
+        """Full build drops outputs of deleted and failed files,
+        keeps outputs of other sources sharing output path"""
+        os.mkdir("other")
+        self.write("other/c.py", 'def extra():\n    """Extra"""\n')
+        pymdoc.build(["other/c.py"], output_path="docs")
+        self.write("src/a.py", 'def main():\n    """Main"""\n')
+        self.write("src/b.py", 'def helper():\n    """Helper"""\n')
+        pymdoc.build(pymdoc.find_files(["src"]), output_path="docs")
+        os.remove("src/b.py")
+        self.write("src/a.py", 'def main(:\n')
+        pymdoc.build(pymdoc.find_files(["src"]), output_path="docs")
+        self.assertEqual(pymdoc.read_index("docs"),
+                         {"other/c.py": {"extra": "extra.md"}})
+        self.assertEqual(sorted(self.read_tree("docs")), [
+            "extra.md", pymdoc.INDEX_FILE_NAME, pymdoc.MANIFEST_FILE_NAME])
+
+    def test_atomic_open(self):
+        """File is replaced only when written without errors,
+        no temporary file is left behind"""
+        self.write("docs/a.md", "old")
+        with self.assertRaises(ValueError):
+            with pymdoc.atomic_open("docs/a.md") as md_file:
+                md_file.write("new")
+                raise ValueError("failed")
+        self.assertEqual(self.read_tree("docs"), {"a.md": "old"})
+        with pymdoc.atomic_open("docs/a.md") as md_file:
+            md_file.write("new")
+        self.assertEqual(self.read_tree("docs"), {"a.md": "new"})
+
+    def test_manifest(self):
+        """Manifest lists generated files of all sources"""
+        self.write("src/a.py", 'def main():\n    """Main"""\n\n'
+                   'LIMIT = 1\n"""Limit"""\n')
+        self.write("src/b.py", 'def load_file():\n    """Load"""\n')
+        pymdoc.build(["src/a.py"], output_path="docs")
+        pymdoc.build(["src/b.py"], output_path="docs")
+        self.assertEqual(self.read_tree("docs")[pymdoc.MANIFEST_FILE_NAME],
+                         "LIMIT.md\nload-file.md\nmain.md\n")
+        os.remove("src/b.py")
+        pymdoc.update(["src/a.py"], ["src/b.py"], "docs")
+        self.assertEqual(self.read_tree("docs")[pymdoc.MANIFEST_FILE_NAME],
+                         "LIMIT.md\nmain.md\n")
+
+    def test_defaults(self):
+        """Default values are shown as written, long ones are cut"""
+        self.write("src/a.py", 'EMPTY = []\n\n'
+                   'def main(a=EMPTY, b=[], c="long default value"):\n'
+                   '    """Main"""\n')
+        extractor = pymdoc.DocstringExtractor(max_default_length=10)
+        extractor.extract("src/a.py")
+        code = extractor.items[0][2]
+        self.assertIn("a=EMPTY,\n", code)
+        self.assertIn("b=[],\n", code)
+        self.assertIn('c="long default value"', pymdoc.DocstringExtractor(
+            filename="src/a.py", output_file=os.devnull).items[0][2])
+        self.assertIn('c="long defa...', code)
+        node = pymdoc.ast.parse('def f(a, /, b=x, c=f"{b}!"): pass').body[0]
+        self.assertEqual(pymdoc.to_source(node, 1),
+                         'f(\n    a,\n    /,\n    b=x,\n    c=f...\n)')
+        self.assertEqual(pymdoc.to_source(node, 7),
+                         'f(\n    a,\n    /,\n    b=x,\n    c=f"{b}!"\n)')
+
+    def test_dump_kinds(self):
+        """Kinds and signatures of items are kept by dump and load"""
+        self.write("src/rules.bzl",
+                   'my_rule = rule(doc = "My rule")\n'
+                   'MyInfo = provider(doc = "My info", fields = ["a"])\n')
+        pymdoc.build(pymdoc.find_files(["src"]), dump_file="docs.jsonl.gz")
+        extractor, = pymdoc.load_dump("docs.jsonl.gz")
+        self.assertEqual(extractor.kinds, ["rule", "provider"])
+        self.assertEqual(extractor.items[1][2], "MyInfo(\n    a\n)")
+        with self.assertRaises(SystemExit):
+            pymdoc.parse_args(["--load", "docs.jsonl", "src"])
+        with self.assertRaises(SystemExit):
+            pymdoc.parse_args(["--load", "docs.jsonl", "--shard", "0/2"])
+
+    def test_diff(self):
+        """Changed items are reported with old and new values,
+        broken files do not stop comparison"""
+        os.mkdir("new")
+        self.write("src/a.py", 'def main():\n    """Old"""\n')
+        self.write("new/a.py", 'def main():\n    """New"""\n')
+        self.write("new/b.py", 'def broken(:\n')
+        report = pymdoc.diff("src", "new")
+        self.assertEqual(report["changed"], [{
+            "file": "a.py", "kind": "function", "name": "main",
+            "changes": ["docstring"],
+            "old": {"docstring": "Old"}, "new": {"docstring": "New"}}])
+        self.assertEqual([error["file"] for error in report["errors"]],
+                         [os.path.join("new", "b.py")])
+        report = pymdoc.diff("src/a.py", "new/a.py")
+        self.assertEqual(report["changed"][0]["file"], "a.py")
+
+    def test_diff_same_names(self):
+        """Methods with the same name in one file are compared
+        one by one"""
+        source = ('class C(object):\n    def run(self):\n'
+                  '        """Run {}"""\n\n'
+                  'class D(object):\n    def run(self):\n'
+                  '        """Run D"""\n')
+        self.write("src/m.py", source.format("C"))
+        os.mkdir("new")
+        self.write("new/m.py", source.format("C again"))
+        report = pymdoc.diff("src", "new")
+        self.assertEqual([(entry["name"], entry["new"]["docstring"])
+                          for entry in report["changed"]],
+                         [("run", "Run C again")])
+        self.write("new/m.py", source.format("C"))
+        self.assertFalse(pymdoc.diff("src", "new")["changed"])
+
+
+if __name__ == "__main__":
+    unittest.main()